@@ -0,0 +1,200 @@
+import socket, socketserver, threading, time, tracemalloc
+from urllib.parse import urlparse, parse_qs
+
+import redis_proxy
+import util.logger as log
+
+'''
+Benchmark for the HTTPHandler.do_GET response path, from the Redis reply to the socket.
+Runs the real handler & RedisProxy methods against a stubbed Redis reply (a cache hit)
+and a local socketpair, so Redis & the network are not needed.
+'''
+SIZES = [1024, 1024**2, 10 * 1024**2, 100 * 1024**2]    # 1 KB - 100 MB
+TOTAL_BYTES = 256 * 1024**2                             # bytes written per size, per path
+MAX_ROUNDS = 1000
+PATH = '/?url=bench&key=bench'
+
+
+class StubRedis:
+    """ Returns the same raw reply for every GET, like a cache hit. """
+    def __init__(self, value):
+        self.value = value
+
+    def execute_command(self, *args, **options):
+        return self.value
+
+
+# the stub proxy must be the singleton before http_server is imported, so no Redis connection is made
+proxy = redis_proxy.RedisProxy.__new__(redis_proxy.RedisProxy)
+proxy.logger = log.setup_logger(__file__, 'bench', 3)
+redis_proxy.RedisProxy._RedisProxy__instance = proxy
+
+import http_server
+
+
+class LegacyHandler(http_server.HTTPHandler):
+    """ do_GET as it was before redis_get_bytes : redis_get -> str() -> bytes() -> write """
+
+    def parse_req_params(self):
+        query = parse_qs(urlparse(self.path).query)
+        return http_server.client.redis_get(query['url'][0], query['key'][0])
+
+    def do_GET(self):
+        data = self.parse_req_params()
+        if data is None:
+            status = 404
+            data = "{'Status': '404 Not Found'}"
+        else:
+            status = 200
+            data = str(data)
+
+        self.send_response(status)
+        self.send_header('content', 'text/html')
+        self.end_headers()
+        self.wfile.write(bytes(data, "utf-8"))
+
+
+class SnapshotSocket:
+    """
+    Socket wrapper taking a tracemalloc snapshot on each send. The last send
+    holds the body, so the snapshot holds every copy of it.
+    """
+    snapshot = None
+
+    def __init__(self, sock):
+        self.sock = sock
+
+    def sendall(self, b):
+        self.snapshot = tracemalloc.take_snapshot()
+        return self.sock.sendall(b)
+
+    def sendmsg(self, buffers):
+        self.snapshot = tracemalloc.take_snapshot()
+        return self.sock.sendmsg(buffers)
+
+
+def make_handler(handler_class, sock):
+    """
+    Build a handler for PATH without running a request through socketserver.
+
+    Parameters
+    ----------
+    handler_class : class
+        http_server.HTTPHandler or LegacyHandler
+    sock : socket | SnapshotSocket
+        where the response is written
+
+    Returns
+    ----------
+    handler : HTTPHandler
+        handler ready for do_GET()
+    """
+    handler = handler_class.__new__(handler_class)
+    handler.path = PATH
+    handler.command = 'GET'
+    handler.request_version = 'HTTP/1.1'
+    handler.requestline = f'GET {PATH} HTTP/1.1'
+    handler.client_address = ('127.0.0.1', 0)
+    handler.connection = sock
+    # the unbuffered wfile used by StreamRequestHandler (wbufsize=0)
+    handler.wfile = socketserver._SocketWriter(sock)
+    handler.log_request = lambda *args: None
+    return handler
+
+
+def drain(sock):
+    """
+    Read and drop everything sent to the socket, until it is closed.
+
+    Parameters
+    ----------
+    sock : socket
+        reader end of the socketpair
+    """
+    buf = bytearray(1048576)
+    while True:
+        try:
+            if sock.recv_into(buf) == 0:
+                return
+        except OSError:
+            return
+
+
+def count_allocations(handler_class, writer):
+    """
+    Run one request & count the allocations still alive when the body is written.
+
+    Parameters
+    ----------
+    handler_class : class
+        http_server.HTTPHandler or LegacyHandler
+    writer : socket
+        writer end of the socketpair
+
+    Returns
+    ----------
+    tuple(blocks : int, size : int, peak : int)
+        allocated blocks & bytes alive at body write, peak traced bytes for the request
+    """
+    snapshot_sock = SnapshotSocket(writer)
+    handler = make_handler(handler_class, snapshot_sock)
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    handler.do_GET()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    stats = snapshot_sock.snapshot.filter_traces(ignore).compare_to(before.filter_traces(ignore), 'lineno')
+    blocks = sum(stat.count_diff for stat in stats if stat.count_diff > 0)
+    size = sum(stat.size_diff for stat in stats if stat.size_diff > 0)
+    return blocks, size, peak
+
+
+def bench(handler_class, rounds):
+    """
+    Allocations & throughput of do_GET for one handler class.
+
+    Parameters
+    ----------
+    handler_class : class
+        http_server.HTTPHandler or LegacyHandler
+    rounds : int
+        number of requests to time
+
+    Returns
+    ----------
+    tuple(blocks : int, size : int, peak : int, mb_per_sec : float)
+    """
+    writer, reader = socket.socketpair()
+    t = threading.Thread(target=drain, args=(reader,), daemon=True)
+    t.start()
+
+    blocks, size, peak = count_allocations(handler_class, writer)
+
+    handler = make_handler(handler_class, writer)
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        handler.do_GET()
+    elapsed = time.perf_counter() - t0
+
+    writer.close()
+    t.join()
+    reader.close()
+    return blocks, size, peak, (len(proxy.redis_client.value) * rounds / 1048576) / elapsed
+
+
+def run():
+    """ Run the benchmark for every size in SIZES & print a table. """
+    print(f"{'size':>10} {'path':>7} {'blocks':>7} {'alloc bytes':>12} {'peak bytes':>12} {'MB/s':>10}")
+    for size in SIZES:
+        proxy.redis_client = StubRedis(b'x' * size)
+        rounds = max(1, min(MAX_ROUNDS, TOTAL_BYTES // size))
+        for name, handler_class in (('legacy', LegacyHandler), ('bytes', http_server.HTTPHandler)):
+            blocks, alloc, peak, mbps = bench(handler_class, rounds)
+            print(f"{size:>10} {name:>7} {blocks:>7} {alloc:>12} {peak:>12} {mbps:>10.1f}")
+
+
+if __name__ == '__main__':
+    run()
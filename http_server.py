@@ -1,4 +1,4 @@
-import os, signal
+import importlib, os, signal, socket, sys, threading, time
 import http.server
 import socketserver
 from urllib.parse import urlparse, parse_qs
@@ -7,6 +7,12 @@ import redis_proxy
 import util.logger as log
 import util.load_env as env
 
+NOT_FOUND_BODY = b"{'Status': '404 Not Found'}"
+STOP_TIMEOUT = 10       # seconds to wait for in-flight requests to drain before SIGKILL
+SUPERVISOR_POLL = 0.5   # seconds between supervisor checks on workers & signals
+STOP_GRACE = 2          # extra seconds stop() gives the supervisor to kill & reap its workers
+WORKER_SIGNALS = {signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGUSR2} # blocked until a worker has its own handlers
+
 client = redis_proxy.RedisProxy.get_instance() #redis_proxy.RedisProxy(rp_host=env.RP_HOST, rp_port=env.RP_PORT, rp_db=env.RP_DB, ttl_sec=env.TTL_SEC, cache_capacity=env.CACHE_CAPACITY, max_clients=env.MAX_CLIENTS, max_mem=env.MAX_MEMORY, evict_policy=env.EVICT_POLICY)
 
 class HTTPHandler(http.server.BaseHTTPRequestHandler):
@@ -19,7 +25,7 @@ class HTTPHandler(http.server.BaseHTTPRequestHandler):
         
         Returns
         -------
-        data : str | None
+        data : bytes | None
             data retrieved from Http GET or Redis Get if cached
         """
         url = parse_qs(urlparse(self.path).query).get('url', None)
@@ -27,28 +33,61 @@ class HTTPHandler(http.server.BaseHTTPRequestHandler):
         key = parse_qs(urlparse(self.path).query).get('key', None)
         
         if url is not None:
-            return client.redis_get(url[0], key[0])
+            return client.redis_get_bytes(url[0], key[0])
         elif payload is not None:
-            return client.redis_get(url[0], key[0], payload)
+            return client.redis_get_bytes(url[0], key[0], payload)
         return 
     
         
     def do_GET(self):
         """
         Map the HTTP GET method to Redis GET       
+        The raw bytes from Redis are sent as-is, without the bytes -> str -> bytes
+        round trip (two copies of the value per request).
         """
         data = self.parse_req_params()
         if data is None:
             status = 404
-            data = "{'Status': '404 Not Found'}"
+            data = NOT_FOUND_BODY
         else:
             status = 200
-            data = str(data)
 
         self.send_response(status)        
         self.send_header('content', 'text/html')
-        self.end_headers()
-        self.wfile.write(bytes(data, "utf-8"))
+        self.send_header('Content-Length', str(len(data)))
+        self.send_headers_and_body(data)
+
+
+    def send_headers_and_body(self, data):
+        """
+        End the headers & send them with the body in one socket.sendmsg call,
+        instead of a headers write followed by a body write (which can stall on
+        Nagle / delayed ACK for small values). Partial sends are resumed from
+        where they stopped. Falls back to end_headers + wfile.write where
+        sendmsg is not available.
+
+        Parameters
+        ----------
+        data : bytes
+            response body
+        """
+        if not hasattr(self.connection, 'sendmsg'):
+            self.end_headers()
+            self.wfile.write(data)
+            return
+
+        if self.request_version != 'HTTP/0.9':
+            self._headers_buffer.append(b"\r\n")
+        headers = b"".join(getattr(self, '_headers_buffer', []))
+        self._headers_buffer = []
+
+        buffers = [memoryview(headers), memoryview(data)]
+        while buffers:
+            sent = self.connection.sendmsg(buffers)
+            while buffers and sent >= len(buffers[0]):
+                sent -= len(buffers.pop(0))
+            if sent:
+                buffers[0] = buffers[0][sent:]
 
 
 
@@ -95,9 +134,84 @@ def read_file_first_line(file_name):
     except:
         return ""
 
+def reload_settings():
+    """
+    Reload the .env file & apply the settings to the RedisProxy instance.
+    The Redis connection pool is kept; host, port & db changes need a restart.
+    Errors are logged and the previous settings are put back, in env & in redis.
+
+    Returns
+    ----------
+    bool
+        False if the settings could not be reloaded
+    """
+    previous = env.snapshot()
+    try:
+        env.load(override=True)
+        conn = client.pool.connection_kwargs
+        if (env.RP_HOST, env.RP_PORT, env.RP_DB) != (conn.get('host'), conn.get('port'), conn.get('db')):
+            logger.warning("RP_HOST, RP_PORT & RP_DB are not reloaded, restart the server to apply them")
+        client.update_settings(env.TTL_SEC, env.CACHE_CAPACITY, env.MAX_CLIENTS, env.MAX_MEMORY, env.EVICT_POLICY)
+    except Exception as e:
+        logger.error("EXCEPTION in reload_settings() {} : {}".format(e, e.__class__))
+        env.restore(*previous)
+        try:
+            # redis may have taken part of the CONFIG SET calls
+            client.update_settings(env.TTL_SEC, env.CACHE_CAPACITY, env.MAX_CLIENTS, env.MAX_MEMORY, env.EVICT_POLICY)
+        except Exception as e:
+            logger.error("EXCEPTION restoring settings in reload_settings() {} : {}".format(e, e.__class__))
+        return False
+    logger.info(f"reloaded settings in {os.getpid()}")
+    return True
+
+
+def serve(httpd):
+    """
+    Serve requests until SIGTERM. On SIGTERM the server stops accepting
+    and returns once the request in flight is done. On SIGHUP the settings
+    are reloaded in place, keeping the Redis pool. SIGUSR2 is logged & ignored,
+    only the supervisor rotates workers.
+
+    Parameters
+    ----------
+    httpd : socketserver
+        server bound to the listening socket
+    """
+    def drain():
+        logger.info(f"draining server process: {os.getpid()}")
+        httpd.shutdown()
+
+    # SIGHUP & SIGUSR2 are only queued by the handler, & handled between requests by
+    # service_actions: a reload inside the handler could deadlock on the redis pool lock
+    pending = []
+    server_service_actions = httpd.service_actions
+    def service_actions():
+        server_service_actions()
+        while pending:
+            if pending.pop(0) == signal.SIGHUP:
+                reload_settings()
+            else:
+                logger.warning(f"SIGUSR2 ignored by {os.getpid()}: worker rotation needs the supervisor (HTTP_WORKERS > 0)")
+    httpd.service_actions = service_actions
+
+    # shutdown() blocks until serve_forever returns, so it can not run in the serving thread
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=drain, daemon=True).start())
+    for sig in (signal.SIGHUP, signal.SIGUSR2):
+        signal.signal(sig, lambda signum, frame: pending.append(signum))
+    # blocked by spawn_worker until the handlers are set
+    signal.pthread_sigmask(signal.SIG_UNBLOCK, WORKER_SIGNALS)
+
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
 def run(server_class=socketserver.TCPServer, host="localhost", port=8080):
     """
-    Run the HTTP server
+    Run the HTTP server in a single process.
+    SIGTERM drains in-flight requests, SIGHUP reloads the .env settings.
+    SIGUSR2 is ignored, worker rotation needs supervise().
     
     Parameters
     ----------
@@ -111,66 +225,397 @@ def run(server_class=socketserver.TCPServer, host="localhost", port=8080):
     try:
         httpd = server_class((host, port), HTTPHandler)
     except:
-        logger.warning(f"server already running at: {get_pid(__file__)}")
+        logger.warning(f"server already running at: {read_file_first_line(env.SERVER_PID_FILE)}")
         return
 
+    pid  = os.getpid()
+    write_to_file(env.SERVER_PID_FILE, pid)
+    logger.info(f'http serving at {pid}') 
+    serve(httpd)
+
+    httpd.server_close()
+    remove_pid_file(pid)
+
+
+def spawn_worker(httpd):
+    """
+    Start a worker process that serves on the shared listening socket.
+    The worker is forked & re-exec'd as 'http_server.py --worker <fd> <server_class>',
+    so it runs the code on disk when it starts, with the settings the supervisor last
+    loaded (see env.ENVIRON). httpd's class must be importable.
+    Signals are blocked across the fork so none sent before the worker sets its handlers are lost.
+
+    Parameters
+    ----------
+    httpd : socketserver
+        server bound to the listening socket, created by the supervisor
+    
+    Returns
+    ----------
+    pid : int
+        pid of the worker
+    """
+    mask = signal.pthread_sigmask(signal.SIG_BLOCK, WORKER_SIGNALS)
     try:
-        pid  = os.getpid()
-        write_to_file(env.SERVER_PID_FILE, pid)
-        logger.info(f'http serving at {pid}') 
-        httpd.serve_forever()
-    except KeyboardInterrupt:
-        pass
+        pid = os.fork()
+    except OSError:
+        signal.pthread_sigmask(signal.SIG_SETMASK, mask)
+        raise
+    if pid:
+        signal.pthread_sigmask(signal.SIG_SETMASK, mask)
+        return pid
+
+    try:
+        # worker: ctrl+c goes to the whole process group, let the supervisor decide
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        fd = httpd.fileno()
+        os.set_inheritable(fd, True)
+        server_class = type(httpd)
+        args = [sys.executable, os.path.abspath(__file__), '--worker', str(fd), f"{server_class.__module__}.{server_class.__qualname__}"]
+        # the settings the supervisor last accepted win over .env, so workers match it even if .env was edited since
+        os.execve(sys.executable, args, {**env.PROCESS_ENVIRON, **env.ENVIRON})
+    except Exception as e:
+        logger.error("EXCEPTION in spawn_worker() {} : {}".format(e, e.__class__))
+    os._exit(1)
+
+
+def import_class(path):
+    """
+    Import a class from its dotted path, e.g. 'socketserver.TCPServer'.
+
+    Parameters
+    ----------
+    path : str
+        module path & class name
+
+    Returns
+    ----------
+    class
+    """
+    module, name = path.rsplit('.', 1)
+    return getattr(importlib.import_module(module), name)
+
+
+def worker(fd, server_class=socketserver.TCPServer):
+    """
+    Serve on the listening socket inherited from the supervisor. Entry point of re-exec'd workers.
+
+    Parameters
+    ----------
+    fd : int
+        file descriptor of the listening socket
+    server_class : socketserver class
+        class the supervisor used to init the server
+    """
+    sock = socket.socket(fileno=fd)
+    httpd = server_class(sock.getsockname(), HTTPHandler, bind_and_activate=False)
+    httpd.socket.close()
+    httpd.socket = sock
 
+    logger.info(f'worker serving at {os.getpid()}')
+    serve(httpd)
     httpd.server_close()
 
 
-def get_pid(name):
+def reap(pids):
     """
-    Get the current pid number for the running http_server.run()
+    Collect the workers that have exited, without blocking.
+
     Parameters
     ----------
-    name : str
-        name of the file to look for
+    pids : set(int)
+        worker pids to check
     
     Returns
     ----------
-    pids : array(int)
-        Array of pids found for the given name
+    exited : set(int)
+        pids that have exited
+    """
+    exited = set()
+    for pid in pids:
+        try:
+            done, _ = os.waitpid(pid, os.WNOHANG)
+        except ChildProcessError:
+            done = pid
+        if done:
+            exited.add(pid)
+    return exited
+
+
+def kill_late(deadlines):
+    """
+    SIGKILL the retiring workers that are past their drain deadline.
+
+    Parameters
+    ----------
+    deadlines : dict(int : float)
+        retiring worker pid -> time.monotonic() deadline
+
+    Returns
+    ----------
+    killed : set(int)
+        pids that were killed & reaped
+    """
+    now = time.monotonic()
+    killed = {pid for pid, deadline in deadlines.items() if deadline < now}
+    for pid in killed:
+        logger.warning(f"worker {pid} did not drain in {STOP_TIMEOUT}s, killing it")
+        send_signal(pid, signal.SIGKILL)
+        reap({pid})
+    return killed
+
+
+def terminate(pids, timeout=STOP_TIMEOUT):
     """
-    import subprocess
-    child = subprocess.Popen(['pgrep', '-f', name], stdout=subprocess.PIPE, shell=False)
-    response = child.communicate()[0]
-    return [int(pid) for pid in response.split()]
+    Send SIGTERM to the workers & wait for them to drain. Workers still
+    running after the timeout are killed.
+
+    Parameters
+    ----------
+    pids : set(int)
+        worker pids to stop
+    timeout : int
+        seconds to wait before SIGKILL
+    """
+    for pid in pids:
+        send_signal(pid, signal.SIGTERM)
+
+    deadline = time.monotonic() + timeout
+    pids = set(pids)
+    while pids and time.monotonic() < deadline:
+        pids -= reap(pids)
+        time.sleep(0.1)
+
+    for pid in pids:
+        logger.warning(f"worker {pid} did not drain in {timeout}s, killing it")
+        send_signal(pid, signal.SIGKILL)
+        reap({pid})
+
+
+def supervise(server_class=socketserver.TCPServer, host="localhost", port=8080, num_workers=2):
+    """
+    Run the HTTP server as a supervisor & a pool of forked workers sharing one listening socket.
+    SIGTERM / SIGINT : drain the workers & stop
+    SIGHUP : reload the .env settings, then forward SIGHUP so the workers reload in place
+    SIGUSR2 : rotate the workers, start new workers, then drain the old ones.
+    Workers are re-exec'd, so a rotation deploys new code. The listening socket stays
+    open the whole time, so there is no downtime during a rotation. Changes to the
+    supervisor itself (this module's supervise & spawn_worker) need a restart.
     
+    Parameters
+    ----------
+    server_class : socketserver class
+        class used to init the server
+    host : str
+        address to bind the http server to
+    port : int
+        port to bind to
+    num_workers : int
+        number of worker processes
+    """
+    try:
+        httpd = server_class((host, port), HTTPHandler)
+    except:
+        logger.warning(f"server already running at: {read_file_first_line(env.SERVER_PID_FILE)}")
+        return
+
+    pid  = os.getpid()
+    write_to_file(env.SERVER_PID_FILE, pid)
+    logger.info(f'http supervisor at {pid}')
+
+    # handlers only queue the signal, the loop below acts on it
+    pending = []
+    for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGUSR2):
+        signal.signal(sig, lambda signum, frame: pending.append(signum))
+
+    workers = {spawn_worker(httpd) for _ in range(num_workers)}
+    retiring = {}   # pid -> drain deadline
+    running = True
+    while running:
+        for done in reap(retiring) | kill_late(retiring):
+            retiring.pop(done, None)
+        for dead in reap(workers):
+            logger.warning(f"worker {dead} exited, starting a new one")
+            workers.discard(dead)
+            workers.add(spawn_worker(httpd))
+
+        while pending and running:
+            sig = pending.pop(0)
+            if sig == signal.SIGHUP:
+                # reload here first so new workers inherit the settings, & a bad .env is only logged once
+                if reload_settings():
+                    for worker in workers:
+                        send_signal(worker, signal.SIGHUP)
+            elif sig == signal.SIGUSR2:
+                num_workers = env.HTTP_WORKERS or num_workers
+                # new workers are accepting before the old ones stop
+                old, workers = workers, {spawn_worker(httpd) for _ in range(num_workers)}
+                deadline = time.monotonic() + STOP_TIMEOUT
+                for worker in old:
+                    send_signal(worker, signal.SIGTERM)
+                    retiring[worker] = deadline
+                logger.info(f"rotated workers {sorted(old)} -> {sorted(workers)}")
+            else:
+                running = False
+
+        if running:
+            time.sleep(SUPERVISOR_POLL)
+
+    terminate(workers | set(retiring))
+    httpd.server_close()
+    remove_pid_file(pid)
+    logger.info(f'http supervisor {pid} stopped')
+
 
-def stop():
+def start(port=8080):
     """
-    Stop the http_server. Try first to stop from the SERVER_PID_FILE.
-    If an exception occurs, get_piid is called. If only 1 process iis running, it is killed. If more than one is running, the piids are logged.
+    Start the http_server. Uses the supervisor when HTTP_WORKERS > 0, a single process otherwise.
+
+    Parameters
+    ----------
+    port : int
+        port to bind to
     """
-    pid = int(read_file_first_line(env.SERVER_PID_FILE))
-    if pid is not None:
+    if env.HTTP_WORKERS > 0:
+        supervise(port=port, num_workers=env.HTTP_WORKERS)
+    else:
+        run(port=port)
+
+
+def remove_pid_file(pid):
+    """
+    Remove the SERVER_PID_FILE if it still belongs to the given pid.
+
+    Parameters
+    ----------
+    pid : int
+        pid of the process that wrote the file
+    """
+    if read_file_first_line(env.SERVER_PID_FILE).strip() == str(pid):
         try:
-            os.kill(pid, signal.SIGKILL)
-            logger.info(f"killed server process: {pid}") 
-        except:
-            pids = get_pid(__file__.lower())
-            if len(pids) == 1:
-                os.kill(pids[0], signal.SIGKILL)
-                logger.info(f"killed server process: {pids[0]}") 
-            else:
-                logger.debug(f"Found PIDS of {__file__}: {pids}")
-                # TODO : decide if killing all found pids is valid, or just allow dev to kill themselves from logs
+            os.remove(env.SERVER_PID_FILE)
+        except OSError:
+            pass
+
+
+def send_signal(pid, sig):
+    """
+    Send a signal to a process.
+
+    Parameters
+    ----------
+    pid : int
+        process to signal
+    sig : signal
+        signal to send
+    
+    Returns
+    ----------
+    bool
+        False if the process does not exist
+    """
+    try:
+        os.kill(pid, sig)
+        return True
+    except ProcessLookupError:
+        return False
+
+
+def read_server_pid():
+    """
+    Read the pid of the running http_server from the SERVER_PID_FILE.
+
+    Returns
+    ----------
+    pid : int | None
+        None if the file is missing or empty
+    """
+    try:
+        return int(read_file_first_line(env.SERVER_PID_FILE))
+    except ValueError:
+        return None
+
+
+def stop(timeout=STOP_TIMEOUT + SUPERVISOR_POLL + STOP_GRACE):
+    """
+    Stop the http_server from the SERVER_PID_FILE. SIGTERM is sent so in-flight
+    requests are drained; SIGKILL is only sent if the server is still running after the timeout.
+    The default timeout is longer than the supervisor's own drain, so it can kill & reap its workers first.
+
+    Parameters
+    ----------
+    timeout : float
+        seconds to wait before SIGKILL
+    """
+    pid = read_server_pid()
+    if pid is None or not send_signal(pid, signal.SIGTERM):
+        logger.warning(f"no server running from {env.SERVER_PID_FILE}")
+        return
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if not send_signal(pid, 0):
+            logger.info(f"stopped server process: {pid}")
+            return
+        time.sleep(0.1)
+
+    send_signal(pid, signal.SIGKILL)
+    remove_pid_file(pid)
+    logger.warning(f"server process {pid} did not stop in {timeout}s, killed it")
+
+
+def signal_server(sig):
+    """
+    Send a signal to the http_server from the SERVER_PID_FILE.
+
+    Parameters
+    ----------
+    sig : signal
+        signal to send
+
+    Returns
+    ----------
+    pid : int | None
+        None if no server is running
+    """
+    pid = read_server_pid()
+    if pid is None or not send_signal(pid, sig):
+        logger.warning(f"no server running from {env.SERVER_PID_FILE}")
+        return None
+    return pid
+
+
+def reload():
+    """
+    Reload the .env settings of the running http_server (SIGHUP).
+    """
+    pid = signal_server(signal.SIGHUP)
+    if pid is not None:
+        logger.info(f"reloading server process: {pid}")
+
+
+def rotate():
+    """
+    Replace the workers of the running supervisor without downtime (SIGUSR2).
+    """
+    pid = signal_server(signal.SIGUSR2)
+    if pid is not None:
+        logger.info(f"rotating workers of server process: {pid}")
 
 
 if __name__ == '__main__':
     from sys import argv
 
-    if len(argv) == 2:
-        if int(argv[1]) < 0:
+    if len(argv) == 4 and argv[1] == '--worker':
+        worker(int(argv[2]), import_class(argv[3]))
+    elif len(argv) == 2:
+        if int(argv[1]) == -3:
+            rotate()
+        elif int(argv[1]) == -2:
+            reload()
+        elif int(argv[1]) < 0:
             stop()
         else:
-            run(port=int(argv[1]))
+            start(port=int(argv[1]))
     else:
-        run()
\ No newline at end of file
+        start()
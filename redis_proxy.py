@@ -1,4 +1,5 @@
 import redis
+from redis.client import NEVER_DECODE
 # Only disable warning for requests import (issue with support with macos & urllib3 https://github.com/urllib3/urllib3/issues/3020)
 import warnings
 warnings.filterwarnings(action='ignore')
@@ -27,6 +28,8 @@ class RedisProxy:
     -------
     get_instance()
         get the current (singleton) instance of RedisProxy
+    update_settings(ttl_sec, cache_capacity, max_clients, max_mem, evict_policy)
+        set the feature settings & redis config values, keeping the connection pool
     __validate_input(params_dict)
         validate the parameters passed to __init__ are valid for redis
     __set_eviction_policy(policy)
@@ -35,8 +38,12 @@ class RedisProxy:
         set config parameters for valid redis config values
     check_key(key)
         returns the value of the key from the redis db
+    check_key_bytes(key)
+        returns the raw (undecoded) value of the key from the redis db
     redis_get(url, key)
         returns data for the given key if it exists, or the data from the url if not    
+    redis_get_bytes(url, key)
+        same as redis_get, but returns the raw bytes without decoding
     """
     __instance = None
     
@@ -88,7 +95,7 @@ class RedisProxy:
             RedisProxy.__instance = self
         
         # validate the user passsed values that are valid for Redis connection
-        ok, msg = self.__validate_input({rp_port:int, rp_db:int, ttl_sec:int, cache_capacity:int, max_clients:int, max_mem:int, evict_policy:str})
+        ok, msg = self.__validate_input({rp_port:int, rp_db:int})
         if not ok:
             raise TypeError([msg])
 
@@ -96,17 +103,47 @@ class RedisProxy:
         self.pool = redis.ConnectionPool(host=rp_host, port=rp_port, db=rp_db, max_connections=max_clients, decode_responses=True)
         self.redis_client = redis.Redis(connection_pool=self.pool)
 
+        # SET feature settings & CONFIG values
+        self.update_settings(ttl_sec, cache_capacity, max_clients, max_mem, evict_policy)
+        
+        self.logger = log.setup_logger(__file__, __class__, 0)
+
+
+    def update_settings(self, ttl_sec, cache_capacity, max_clients, max_mem, evict_policy):
+        """
+        Set the feature settings & redis config values. Used by __init__ and on reload.
+        The connection pool is kept, so open connections are not dropped.
+        
+        Parameters
+        ----------
+        ttl_sec : int
+            number of seconds before a key expires
+        cache_capacity : int
+            max number of key/value pairs that can be cached. Must be between 0 - 2^32
+        max_clients : int
+            max number of clients that can be connected at a time. must be between 0-10,000
+        max_mem : int
+            max memory allocated for Redis to use, in conjunction with evict_policy.
+        evict_policy : str
+            Must be a valid redis eviction policy
+        """
+        ok, msg = self.__validate_input({ttl_sec:int, cache_capacity:int, max_clients:int, max_mem:int, evict_policy:str})
+        if not ok:
+            raise TypeError([msg])
+
+        cache_capacity = cache_capacity if cache_capacity < BASE_CACHE_CAPACITY else BASE_CACHE_CAPACITY
+        max_clients = max_clients if max_clients < BASE_MAX_CLIENTS else BASE_MAX_CLIENTS
+
+        # SET CONFIG values first, so the feature settings are unchanged if redis rejects one
+        self.__set_eviction_policy(evict_policy)
+        self.__set_config_features({'proto-max-bulk-len': cache_capacity, 'maxclients': max_clients, 'maxmemory': max_mem})
+
         # SET feature settings
         self.TTL_SEC = ttl_sec                   
-        self.CACHE_CAPACITY = cache_capacity if cache_capacity < BASE_CACHE_CAPACITY else BASE_CACHE_CAPACITY   
-        self.MAX_CLIENTS = max_clients if max_clients < BASE_MAX_CLIENTS else BASE_MAX_CLIENTS       
+        self.CACHE_CAPACITY = cache_capacity
+        self.MAX_CLIENTS = max_clients
         self.MAX_MEMORY = max_mem       
-        
-        # SET CONFIG values
-        self.__set_eviction_policy(evict_policy)
-        self.__set_config_features({'proto-max-bulk-len': self.CACHE_CAPACITY, 'maxclients': self.MAX_CLIENTS, 'maxmemory': self.MAX_MEMORY})
-        
-        self.logger = log.setup_logger(__file__, __class__, 0)
+        self.pool.max_connections = max_clients
     
     
     def __validate_input(self, params_dict):
@@ -201,11 +238,32 @@ class RedisProxy:
         """
         return self.redis_client.get(key)    
 
+
+    def check_key_bytes(self, key):
+        """
+        Check if a key is in the redis DB, returning the reply buffer as-is.
+        The pool uses decode_responses=True, so NEVER_DECODE is passed to skip
+        the bytes -> str conversion for this call only.
+        Time Complexity : O(1)
+        
+        Parameters
+        ----------
+        key : str
+            The desired redis lookup key
+
+        Returns
+        -------
+        value : bytes | None
+            None OR the raw value for the requested key
+        """
+        return self.redis_client.execute_command('GET', key, **{NEVER_DECODE: True})
+
     
     def redis_get(self, http_url, key, payload=None):
         """
         Cached GET
-        map http get to redis get
+        map http get to redis get. Same as redis_get_bytes, with the value decoded to str.
+        Values that are not utf-8 are still cached (for redis_get_bytes), but return None here.
         Time Complexity : O(N) - due to .decode()
         
         Parameters
@@ -221,7 +279,38 @@ class RedisProxy:
             the value stored in the redis db for the requested key
         """
 
-        data = self.check_key(key) # O(1)
+        data = self.redis_get_bytes(http_url, key, payload)
+        if data is not None:
+            try:
+                data = data.decode() # O(N)
+            except UnicodeDecodeError as e:
+                self.logger.error("EXCEPTION in redis_get() {} : {}".format(e, e.__class__))
+                data = None
+        
+        return data
+
+
+    def redis_get_bytes(self, http_url, key, payload=None):
+        """
+        Cached GET without decoding.
+        Used by the http server so the value can be written to the socket
+        without the str/bytes round trip done by redis_get.
+        Time Complexity : O(1) on a cache hit, plus the http request on a miss
+        
+        Parameters
+        ----------
+        http_url : str
+            The desired url for the http request
+        key : str
+            The key for the desired data
+
+        Returns
+        -------
+        data : bytes | None
+            the raw value stored in the redis db for the requested key
+        """
+
+        data = self.check_key_bytes(key) # O(1)
         if data is None:
             try:    
                 
@@ -229,15 +318,12 @@ class RedisProxy:
                     data = requests.get(http_url, params=payload)
                 else:
                     data = requests.get(http_url)        
-                data = data.content.decode() # O(N)
+                data = data.content
         
                 if len(data) <= MAX_DATA_LEN:
                     self.redis_client.setex(key, self.TTL_SEC, data) # O(1)
             except Exception as e:
-                self.logger.error("EXCEPTION in redis_get() {} : {}".format(e, e.__class__))
+                self.logger.error("EXCEPTION in redis_get_bytes() {} : {}".format(e, e.__class__))
                 data = None
         
-        if isinstance(data, bytes):
-            data = data.decode()
-        
-        return data
\ No newline at end of file
+        return data
@@ -1,12 +1,16 @@
-import datetime, time
+import datetime, os, signal, socket, subprocess, sys, tempfile, threading, time
 from datetime import timedelta
 import unittest
+from unittest import mock
 unittest.TestLoader.sortTestMethodsUsing = None # run tests in alpha order
 import concurrent.futures
+import http.server
+from urllib.parse import urlparse, parse_qs
 import redis.exceptions as redis_excp
 
 import redis_proxy
 from redis_proxy import requests
+import http_server
 import util.logger as log
 import util.load_env as env
 
@@ -33,6 +37,28 @@ class TestConfiguration(unittest.TestCase):
     def test_max_value_size(self):
         self.assertEqual(self.client.CACHE_CAPACITY, env.CACHE_CAPACITY)
 
+    def test_update_settings(self):
+        # used on SIGHUP reload, restore the .env settings after
+        self.addCleanup(self.client.update_settings, env.TTL_SEC, env.CACHE_CAPACITY, env.MAX_CLIENTS, env.MAX_MEMORY, env.EVICT_POLICY)
+        self.client.update_settings(env.TTL_SEC+1, env.CACHE_CAPACITY, env.MAX_CLIENTS+1, env.MAX_MEMORY, env.EVICT_POLICY)
+        config = self.client.redis_client.config_get()
+
+        self.assertEqual(self.client.TTL_SEC, env.TTL_SEC+1)
+        self.assertEqual(self.client.MAX_CLIENTS, env.MAX_CLIENTS+1)
+        self.assertEqual(int(config['maxclients']), env.MAX_CLIENTS+1)
+
+    def test_env_load(self):
+        # the process environment wins over .env unless override=True
+        ttl_sec, environ_ttl = env.TTL_SEC, os.environ['TTL_SEC']
+        def restore():
+            os.environ['TTL_SEC'] = environ_ttl
+            env.load()
+        self.addCleanup(restore)
+        os.environ['TTL_SEC'] = str(ttl_sec+1)
+        env.load()
+
+        self.assertEqual(env.TTL_SEC, ttl_sec+1)
+
 
 class TestConcurrentUsers(unittest.TestCase):
     # global test variables
@@ -149,7 +175,26 @@ class TestRedis(unittest.TestCase):
         # assertions
         self.assertEqual(start_value0, None)
         self.assertEqual(start_value1, start_value3)
-         
+
+    def test_redis_get_bytes(self):
+
+        test_key = self.test_key.format('get_bytes')
+        bytes_value = self.client.redis_get_bytes(self.test_url, test_key)
+        str_value = self.client.redis_get(self.test_url, test_key)
+
+        self.logger.debug(f"{test_key} - bytes: {type(bytes_value)} == str.encode(): {type(str_value)}")
+
+        # assertions
+        self.assertIsInstance(bytes_value, bytes)
+        self.assertEqual(bytes_value, str_value.encode())
+
+    def test_check_key_bytes_missing_key(self):
+
+        test_key = self.test_key.format('missing_bytes')
+
+        # assertions
+        self.assertEqual(self.client.check_key_bytes(test_key), None)
+
     def test_valid_data_saved_to_rcache(self):
 
         test_key = self.test_key.format('to_cache')
@@ -206,7 +251,206 @@ class TestWebRedis(unittest.TestCase):
         self.assertEqual(res1.content, res2.content)
         self.assertLess(t4, t_delta)
         self.assertEqual(res2.content, res3.content)
+
+    def test_http_response_body(self):
+
+        test_key = self.test_key.format('http_body')
+        payload = {"url":self.test_url, "key":test_key}
+        res = requests.get(self.test_http_server,  params=payload)
+        cached = self.client.check_key_bytes(test_key)
+
+        # assertions
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.content, cached)
+        self.assertEqual(int(res.headers['Content-Length']), len(cached))
+
+    def test_http_raw_bytes(self):
+        # values that are not utf-8 are sent as-is
+
+        test_key = self.test_key.format('http_raw')
+        value = b'\xff\xfe\x00raw'
+        self.client.redis_client.setex(test_key, self.client.TTL_SEC, value)
+        res = requests.get(self.test_http_server,  params={"url":self.test_url, "key":test_key})
+
+        # assertions
+        self.assertEqual(res.content, value)
+        self.assertEqual(int(res.headers['Content-Length']), len(value))
+
+    def test_http_not_found(self):
+
+        res = requests.get(self.test_http_server)
+
+        # assertions
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(res.content, http_server.NOT_FOUND_BODY)
+        self.assertEqual(int(res.headers['Content-Length']), len(http_server.NOT_FOUND_BODY))
         
 
+
+class SlowUpstream(http.server.BaseHTTPRequestHandler):
+    """ Upstream url for the proxy. Sleeps for the 'sleep' query param before answering. """
+    body = b'slow upstream'
+
+    def do_GET(self):
+        time.sleep(float(parse_qs(urlparse(self.path).query).get('sleep', ['0'])[0]))
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestSupervisor(unittest.TestCase):
+    # runs the server in a subprocess on a spare port, with its own pid & log file
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    num_workers = 2
+
+    logger = log.setup_logger(__file__, "TestSupervisor", 0)
+    logger.info(f"\n\t---->>> STARTED TEST Supervisor RUN at {datetime.datetime.now()} ")
+
+    def setUp(self):
+        tmp = tempfile.mkdtemp()
+        self.pid_file = os.path.join(tmp, 'server.pid')
+        self.log_file = os.path.join(tmp, 'server.log')
+
+        self.upstream = http.server.ThreadingHTTPServer(('localhost', 0), SlowUpstream)
+        threading.Thread(target=self.upstream.serve_forever, daemon=True).start()
+        self.addCleanup(self.upstream.server_close)
+        self.addCleanup(self.upstream.shutdown)
+
+    def start_server(self, call):
+        """ start http_server.<call> on a spare port & wait for it to answer """
+        with socket.socket() as sock:
+            sock.bind(('localhost', 0))
+            self.port = sock.getsockname()[1]
+        self.server_url = f"http://localhost:{self.port}"
+
+        environ = dict(os.environ, SERVER_PID_FILE=self.pid_file, LOG_FILE=self.log_file)
+        code = f"import http_server; http_server.{call.format(port=self.port)}"
+        self.process = subprocess.Popen([sys.executable, '-c', code], cwd=self.repo_dir, env=environ)
+        self.addCleanup(self.stop_server)
+
+        self.wait_for(lambda: self.answers())
+        self.wait_for(lambda: len(self.workers()) == self.num_workers or call.startswith('run'))
+
+    def stop_server(self):
+        if self.process.poll() is None:
+            self.process.send_signal(signal.SIGTERM)
+            try:
+                self.process.wait(http_server.STOP_TIMEOUT + 5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+
+    def answers(self):
+        try:
+            return requests.get(self.server_url, timeout=5).status_code == 404
+        except requests.exceptions.RequestException:
+            return False
+
+    def workers(self):
+        """ pids of the supervisor's children """
+        out = subprocess.run(['pgrep', '-P', str(self.process.pid)], capture_output=True, text=True).stdout
+        return {int(pid) for pid in out.split()}
+
+    def wait_for(self, check, timeout=15):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if check():
+                return
+            time.sleep(0.1)
+        self.fail(f"timed out after {timeout}s")
+
+    def slow_get(self, sleep, results):
+        """ GET through the proxy with an upstream that takes sleep seconds, result appended to results """
+        upstream_url = f"http://localhost:{self.upstream.server_address[1]}/?sleep={sleep}"
+        payload = {"url":upstream_url, "key":f"test:supervisor:{time.time()}"}
+        try:
+            results.append(requests.get(self.server_url, params=payload, timeout=30))
+        except requests.exceptions.RequestException as e:
+            results.append(e)
+
+    def test_sigterm_drains_in_flight(self):
+        self.start_server("supervise(port={port}, num_workers=2)")
+        results = []
+        t = threading.Thread(target=self.slow_get, args=(2, results))
+        t.start()
+        time.sleep(0.5)
+        self.process.send_signal(signal.SIGTERM)
+        t.join()
+
+        # assertions
+        self.assertEqual(results[0].status_code, 200)
+        self.assertEqual(results[0].content, SlowUpstream.body)
+        self.assertEqual(self.process.wait(http_server.STOP_TIMEOUT), 0)
+        self.assertFalse(os.path.exists(self.pid_file))
+
+    def test_stop_falls_back_to_sigkill(self):
+        self.start_server("run(port={port})")
+        t = threading.Thread(target=self.slow_get, args=(5, []), daemon=True)
+        t.start()
+        time.sleep(0.5)
+        with mock.patch.object(env, 'SERVER_PID_FILE', self.pid_file):
+            http_server.stop(timeout=1)
+
+        # assertions
+        self.assertEqual(self.process.wait(5), -signal.SIGKILL)
+        self.assertFalse(os.path.exists(self.pid_file))
+
+    def test_sighup_reloads_workers(self):
+        self.start_server("supervise(port={port}, num_workers=2)")
+        workers = self.workers()
+        self.process.send_signal(signal.SIGHUP)
+
+        def reloaded():
+            with open(self.log_file) as log_file:
+                logs = log_file.read()
+            return all(f"reloaded settings in {pid}" in logs for pid in workers | {self.process.pid})
+
+        # assertions
+        self.wait_for(reloaded)
+        self.assertEqual(self.workers(), workers)
+
+    def test_sigusr2_rotates_workers(self):
+        self.start_server("supervise(port={port}, num_workers=2)")
+        old = self.workers()
+        answered, failed, done = [0], [], threading.Event()
+
+        def hammer():
+            while not done.is_set():
+                try:
+                    requests.get(self.server_url, timeout=5).raise_for_status()
+                except requests.exceptions.HTTPError as e:
+                    answered[0] += e.response.status_code == 404
+                except requests.exceptions.RequestException as e:
+                    failed.append(e)
+
+        t = threading.Thread(target=hammer)
+        t.start()
+        self.process.send_signal(signal.SIGUSR2)
+        try:
+            self.wait_for(lambda: len(self.workers()) == self.num_workers and not self.workers() & old)
+            time.sleep(0.5)
+        finally:
+            done.set()
+            t.join()
+
+        self.logger.debug(f"rotated {old} -> {self.workers()}, answered {answered[0]}, failed {len(failed)}")
+        # assertions
+        self.assertGreater(answered[0], 0)
+        self.assertEqual(failed, [])
+
+    def test_crashed_worker_respawned(self):
+        self.start_server("supervise(port={port}, num_workers=2)")
+        crashed = self.workers().pop()
+        os.kill(crashed, signal.SIGKILL)
+
+        # assertions
+        self.wait_for(lambda: len(self.workers()) == self.num_workers and crashed not in self.workers())
+        self.assertTrue(self.answers())
+
+
 if __name__ == '__main__':
     unittest.main(verbosity=2)
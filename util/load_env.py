@@ -1,20 +1,72 @@
 import os
 from dotenv import load_dotenv
 
-load_dotenv()
-
-RP_HOST = os.getenv('RP_HOST')
-RP_PORT = int(os.getenv('RP_PORT'))
-RP_DB = int(os.getenv('RP_DB'))
-TTL_SEC = int(os.getenv('TTL_SEC'))
-CACHE_CAPACITY=int(os.getenv('CACHE_CAPACITY'))*1048576 # MB to Bytes
-MAX_CLIENTS = int(os.getenv('MAX_CLIENTS'))
-MAX_MEMORY = int(os.getenv('MAX_MEMORY'))*1048576 # MB to Bytes
-EVICT_POLICY = os.getenv('EVICT_POLICY')
-SERVER_PID_FILE = os.getenv('SERVER_PID_FILE')
-HTTP_PORT = int(os.getenv('HTTP_PORT'))
-HTTP_HOST = os.getenv('HTTP_HOST')
-LOG_FILE = os.getenv('LOG_FILE')
-
-
-THIRD_PARTY_TEST_URL=os.getenv('THIRD_PARTY_TEST_URL')
\ No newline at end of file
+# the environment the process was started with, before .env is loaded into it
+PROCESS_ENVIRON = dict(os.environ)
+SETTINGS = {}   # values of the last successful load
+ENVIRON = {}    # the raw strings SETTINGS were parsed from, passed on to re-exec'd workers
+
+
+def load(override=False):
+    """
+    (Re)load the .env file & store the values as module variables.
+    All values are parsed before any is stored, so a bad value leaves the previous settings in place.
+
+    Parameters
+    ----------
+    override : bool
+        let .env values override the process environment. False on startup, True on reload.
+    """
+    load_dotenv(override=override)
+
+    values = dict(
+        RP_HOST = os.getenv('RP_HOST'),
+        RP_PORT = int(os.getenv('RP_PORT')),
+        RP_DB = int(os.getenv('RP_DB')),
+        TTL_SEC = int(os.getenv('TTL_SEC')),
+        CACHE_CAPACITY=int(os.getenv('CACHE_CAPACITY'))*1048576, # MB to Bytes
+        MAX_CLIENTS = int(os.getenv('MAX_CLIENTS')),
+        MAX_MEMORY = int(os.getenv('MAX_MEMORY'))*1048576, # MB to Bytes
+        EVICT_POLICY = os.getenv('EVICT_POLICY'),
+        SERVER_PID_FILE = os.getenv('SERVER_PID_FILE'),
+        HTTP_PORT = int(os.getenv('HTTP_PORT')),
+        HTTP_HOST = os.getenv('HTTP_HOST'),
+        HTTP_WORKERS = int(os.getenv('HTTP_WORKERS', 0)), # 0 = single process, no supervisor
+        LOG_FILE = os.getenv('LOG_FILE'),
+
+
+        THIRD_PARTY_TEST_URL=os.getenv('THIRD_PARTY_TEST_URL'),
+    )
+    restore(values, {name: os.environ[name] for name in values if name in os.environ})
+
+
+def snapshot():
+    """
+    Copy the current settings, so they can be put back with restore().
+
+    Returns
+    ----------
+    tuple(settings : dict, environ : dict)
+        copies of SETTINGS & ENVIRON
+    """
+    return dict(SETTINGS), dict(ENVIRON)
+
+
+def restore(settings, environ):
+    """
+    Store settings as module variables & their raw strings in ENVIRON & os.environ.
+
+    Parameters
+    ----------
+    settings : dict(str : any)
+        setting name -> value
+    environ : dict(str : str)
+        setting name -> raw string from the environment / .env
+    """
+    global SETTINGS, ENVIRON
+    globals().update(settings)
+    os.environ.update(environ)
+    SETTINGS, ENVIRON = dict(settings), dict(environ)
+
+
+load()